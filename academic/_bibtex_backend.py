@@ -0,0 +1,83 @@
+import functools
+import itertools
+import unicodedata
+
+import bibtexparser
+from bibtexparser import latexenc
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bparser import BibTexParser
+
+from academic import utils
+
+try:
+    # Optional Rust-backed parser, considerably faster on large bibliographies.
+    import citerra
+except ImportError:
+    citerra = None
+
+# The few LaTeX sequences that bibtexparser converts to unicode which do not contain a backslash.
+LATEX_WITHOUT_BACKSLASH = [
+    (char, latex.rstrip()) for char, latex in itertools.chain(latexenc.unicode_to_crappy_latex1, latexenc.unicode_to_latex) if "\\" not in latex
+]
+
+
+def load_entries(path):
+    """Parse a BibTeX file into a list of entry dicts, using the fastest parser available
+
+    Each entry maps its lowercase field names to their values, plus `ID` and `ENTRYTYPE`.
+    LaTeX in the field values is converted to unicode.
+    """
+    if citerra is not None:
+        return [convert_to_unicode(entry) for entry in _citerra_entries(path)]
+
+    # The parser adds entries to its database, so give it an empty one for each file.
+    parser = _bibtex_parser()
+    parser.bib_database = BibDatabase()
+    parser.bib_database.load_common_strings()
+    return bibtexparser.loads(utils.read_file(path), parser=parser).entries
+
+
+def _citerra_entries(path):
+    """Parse a BibTeX file with citerra into entry dicts like those of bibtexparser, with `@string` macros expanded"""
+    doc = citerra.Parser(expand_values=True).parse_file(str(path))
+    # `to_dicts` gives the unexpanded values, so only take the entry type and key from it.
+    return [
+        dict(ENTRYTYPE=entry["ENTRYTYPE"], ID=entry["ID"], **{field.name.lower(): field.expanded for field in parsed.fields})
+        for entry, parsed in zip(doc.to_dicts(), doc.entries)
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _bibtex_parser():
+    """Create the BibTeX parser once, as building its grammar is relatively expensive. Not thread-safe."""
+    parser = BibTexParser(common_strings=True)
+    parser.customization = convert_to_unicode
+    parser.ignore_nonstandard_types = False
+    return parser
+
+
+def convert_to_unicode(record):
+    """Convert LaTeX in the values of a BibTeX entry to unicode, like `bibtexparser.customization.convert_to_unicode`"""
+    for field, value in record.items():
+        if isinstance(value, list):
+            record[field] = [latex_to_unicode(v) for v in value]
+        elif isinstance(value, dict):
+            record[field] = {k: latex_to_unicode(v) for k, v in value.items()}
+        else:
+            record[field] = latex_to_unicode(value)
+    return record
+
+
+def latex_to_unicode(s):
+    """Convert LaTeX in a string to unicode, giving the same result as `bibtexparser.latexenc.latex_to_unicode`
+
+    bibtexparser searches a value for each of its ~2500 LaTeX sequences whenever it contains a brace or backslash.
+    Values without a backslash, such as `{{University of Somewhere}}`, can only contain the few sequences without one.
+    """
+    if "\\" in s:
+        return latexenc.latex_to_unicode(s)
+    if "{" in s:
+        for char, latex in LATEX_WITHOUT_BACKSLASH:
+            if latex in s:
+                s = s.replace(latex, char)
+    return unicodedata.normalize("NFC", s.replace("{", "").replace("}", ""))
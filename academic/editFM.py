@@ -1,7 +1,11 @@
+import copy
+from io import StringIO
 from pathlib import Path
 
 from ruamel.yaml import YAML
 
+from academic import utils
+
 yaml = YAML()
 
 
@@ -16,13 +20,18 @@ class EditableFM:
         self.path = ""
         self.dry_run = dry_run
 
-    def load(self, file: Path):
+    def load(self, file: Path, template=None):
+        """Load a page, starting from a copy of the `template` front matter if the page does not exist yet."""
         self.fm = []
         self.content = []
         self.path = self.base_path / file
-        if self.dry_run and not self.path.exists():
-            self.fm = dict()
-            return
+        if not self.path.exists():
+            if self.dry_run:
+                self.fm = dict()
+                return
+            if template is not None:
+                self.fm = copy.deepcopy(template)
+                return
 
         with self.path.open("r", encoding="utf-8") as f:
             lines = f.readlines()
@@ -51,5 +60,6 @@ class EditableFM:
         if self.dry_run:
             return
 
-        with open(self.path, "w", encoding="utf-8") as f:
+        with StringIO() as f:
             self.write_to_file(f)
+            utils.write_file(self.path, f.getvalue())
@@ -1,25 +1,121 @@
 import calendar
+import functools
+import logging
 import os
 import re
 import subprocess
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-import bibtexparser
 from bibtexparser.bibdatabase import BibDatabase
-from bibtexparser.bparser import BibTexParser
 from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.customization import convert_to_unicode
+from bibtexparser.customization import splitname
 
 from academic import utils
-from academic.editFM import EditableFM
+from academic._bibtex_backend import load_entries
+from academic.editFM import EditableFM, yaml
 from academic.publication_type import PUB_TYPES, PublicationType
 
+log = logging.getLogger(__name__)
+
+# Bibliographies larger than this are imported using a pool of worker processes.
+PARALLEL_IMPORT_THRESHOLD = 8
+PARALLEL_IMPORT_CHUNKSIZE = 20
+
+# Patterns used to convert BibTeX keys into slugs, compiled once as `slugify` runs for every entry.
+SLUG_DELIMITER_TABLE = str.maketrans("._:", "---")
+SLUG_STRIP_TABLE = {i: None for i in range(128) if not (chr(i).isalnum() or chr(i) == "-")}
+RE_SLUG_BOUNDARY = re.compile(
+    r"""
+    (?<=\D)(?=\d)  # Non-number, number.
+    |(?<=\d)(?=\D)  # Number, non-number.
+    |(?<=[a-z])(?=[A-Z])|(?<!\A)(?=[A-Z][a-z])  # Camelcase.
+    """,
+    re.VERBOSE,
+)
+RE_CONSECUTIVE_HYPHENS = re.compile(r"-{2,}")
+
+# Separator between names in BibTeX author and editor fields.
+RE_AUTHOR_SEPARATOR = re.compile(r"\s+and\s+")
+
+# Map month abbreviations, such as `Jan`, to zero-padded month numbers.
+MONTH_NUMBERS = {abbr: str(i).zfill(2) for i, abbr in enumerate(calendar.month_abbr) if abbr}
+
+# Site archetypes overriding the publication template. New pages are only created with `hugo new` if one exists.
+SITE_ARCHETYPES = ("archetypes/publication/index.md", "archetypes/publication.md")
+
+# Front matter template for new publication pages.
+# Used directly rather than via `hugo new --kind publication`, which would spawn a Hugo process per entry.
+PUBLICATION_ARCHETYPE = yaml.load(
+    """
+title: ""
+authors: []
+date: ""
+doi: ""
+
+# Publication type.
+# Legend: 0 = Uncategorized; 1 = Conference paper; 2 = Journal article;
+# 3 = Preprint / Working Paper; 4 = Report; 5 = Book; 6 = Book section;
+# 7 = Thesis; 8 = Patent
+publication_types: ["0"]
+
+# Publication name and optional abbreviated publication name.
+publication: ""
+publication_short: ""
+
+abstract: ""
+
+# Summary. An optional shortened abstract.
+summary: ""
+
+tags: []
+
+# Display this page in the Featured widget?
+featured: false
+
+# Custom links (uncomment lines below)
+# links:
+# - name: Custom Link
+#   url: http://example.org
+
+url_pdf: ""
+url_code: ""
+url_dataset: ""
+url_poster: ""
+url_project: ""
+url_slides: ""
+url_source: ""
+url_video: ""
+
+# Featured image
+# To use, add an image named `featured.jpg/png` to your page's folder.
+image:
+  caption: ""
+  focal_point: ""
+  preview_only: false
+
+# Associated Projects (optional).
+#   Associate this publication with one or more of your projects.
+#   Simply enter your project's folder or file name without extension.
+#   E.g. `internal-project` references `content/project/internal-project/index.md`.
+#   Otherwise, set `projects: []`.
+projects: []
+
+# Slides (optional).
+#   Associate this publication with Markdown slides.
+#   Simply enter your slide deck's filename without extension.
+#   E.g. `slides: "example"` references `content/slides/example/index.md`.
+#   Otherwise, set `slides: ""`.
+slides: ""
+"""
+)
+
 
 def import_bibtex(bibtex, pub_dir="publication", featured=False, overwrite=False, normalize=False, dry_run=False, publish_date_from_bibtex=False):
     """Import publications from BibTeX file"""
-    from academic.cli import AcademicError, log
+    from academic.cli import AcademicError
 
     # Check BibTeX file exists.
     if not Path(bibtex).is_file():
@@ -28,28 +124,97 @@ def import_bibtex(bibtex, pub_dir="publication", featured=False, overwrite=False
         raise AcademicError(err)
 
     # Load BibTeX file for parsing.
-    with open(bibtex, "r", encoding="utf-8") as bibtex_file:
-        parser = BibTexParser(common_strings=True)
-        parser.customization = convert_to_unicode
-        parser.ignore_nonstandard_types = False
-        bib_database = bibtexparser.load(bibtex_file, parser=parser)
-        for entry in bib_database.entries:
-            parse_bibtex_entry(
-                entry,
-                pub_dir=pub_dir,
-                featured=featured,
-                overwrite=overwrite,
-                normalize=normalize,
-                dry_run=dry_run,
-                publish_date_from_bibtex=publish_date_from_bibtex,
-            )
-
-
-def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=False, normalize=False, dry_run=False, publish_date_from_bibtex=False):
-    """Parse a bibtex entry and generate corresponding publication bundle"""
-    from academic.cli import log
+    entries = load_entries(bibtex)
+
+    # Choose the entries to import before dispatching them, so that each bundle is written by a single entry.
+    # The existing bundles are listed once rather than checking for each entry.
+    try:
+        with os.scandir(f"content/{pub_dir}") as it:
+            existing_bundles = {bundle.name for bundle in it if bundle.is_dir()}
+    except OSError:
+        existing_bundles = set()
+    slugs = set()
+    new_entries = []
+    for entry in entries:
+        slug = slugify(entry["ID"])
+        bundle_path = f"content/{pub_dir}/{slug}"
+        if not overwrite and slug in existing_bundles:
+            log.warning("Skipping creation of %s as it already exists. To overwrite, add the `--overwrite` argument.", bundle_path)
+        elif slug in slugs:
+            log.warning("Skipping entry %s as an earlier entry is already imported to %s.", entry["ID"], bundle_path)
+        else:
+            slugs.add(slug)
+            new_entries.append(entry)
+
+    # Render a site's own publication archetype with Hugo, as the bundled template would not match it.
+    hugo = None
+    archetype = next((path for path in SITE_ARCHETYPES if Path(path).is_file()), None)
+    if archetype:
+        log.info("Creating pages from the site archetype %s with `hugo new`", archetype)
+        hugo = utils.hugo_in_docker_or_local()
+
+    # Share a single writer between entries rather than constructing one per citation.
+    import_entries = functools.partial(
+        _import_bibtex_entries,
+        writer=BibTexWriter(),
+        hugo=hugo,
+        pub_dir=pub_dir,
+        featured=featured,
+        normalize=normalize,
+        dry_run=dry_run,
+        publish_date_from_bibtex=publish_date_from_bibtex,
+    )
+    # Dry runs write no files, so there is nothing to gain from worker processes.
+    if dry_run or len(new_entries) <= PARALLEL_IMPORT_THRESHOLD:
+        import_entries(new_entries)
+        return
 
-    log.info(f"Parsing entry {entry['ID']}")
+    # Each entry is written to its own bundle, so chunks of entries can be imported independently.
+    root = logging.getLogger()
+    formatter = root.handlers[0].formatter if root.handlers else None
+    with ProcessPoolExecutor(initializer=_init_import_worker, initargs=(root.level, formatter)) as executor:
+        bounds = [*range(0, len(new_entries), PARALLEL_IMPORT_CHUNKSIZE), len(new_entries)]
+        futures = [executor.submit(import_entries, new_entries[start:end]) for start, end in zip(bounds, bounds[1:])]
+        try:
+            for future in futures:
+                future.result()
+        except Exception:
+            # Stop on the first error like the serial import. Chunks that were already started still finish.
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _init_import_worker(level, formatter):
+    """Configure logging in a worker process like in the parent, as spawned workers do not inherit it"""
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _import_bibtex_entries(entries, **kwargs):
+    """Import bibtex entries, discarding the resulting pages so they are not sent back from worker processes"""
+    # Entries whose bundle should not be overwritten were already skipped by `import_bibtex`.
+    for entry in entries:
+        parse_bibtex_entry(entry, overwrite=True, **kwargs)
+
+
+def parse_bibtex_entry(
+    entry,
+    pub_dir="publication",
+    featured=False,
+    overwrite=False,
+    normalize=False,
+    dry_run=False,
+    publish_date_from_bibtex=False,
+    writer=None,
+    hugo=None,
+):
+    """Parse a bibtex entry and generate corresponding publication bundle"""
+    log.info("Parsing entry %s", entry["ID"])
 
     bundle_path = f"content/{pub_dir}/{slugify(entry['ID'])}"
     markdown_path = os.path.join(bundle_path, "index.md")
@@ -59,32 +224,31 @@ def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=F
 
     # Do not overwrite publication bundle if it already exists.
     if not overwrite and os.path.isdir(bundle_path):
-        log.warning(f"Skipping creation of {bundle_path} as it already exists. " f"To overwrite, add the `--overwrite` argument.")
+        log.warning("Skipping creation of %s as it already exists. To overwrite, add the `--overwrite` argument.", bundle_path)
         return
 
     # Create bundle dir.
-    log.info(f"Creating folder {bundle_path}")
+    log.info("Creating folder %s", bundle_path)
     if not dry_run:
         Path(bundle_path).mkdir(parents=True, exist_ok=True)
 
     # Save citation file.
-    log.info(f"Saving citation to {cite_path}")
-    db = BibDatabase()
-    db.entries = [entry]
-    writer = BibTexWriter()
-    if not dry_run:
-        with open(cite_path, "w", encoding="utf-8") as f:
-            f.write(writer.write(db))
-
-    # Prepare YAML front matter for Markdown file.
-    hugo = utils.hugo_in_docker_or_local()
+    log.info("Saving citation to %s", cite_path)
     if not dry_run:
+        db = BibDatabase()
+        db.entries = [entry]
+        if writer is None:
+            writer = BibTexWriter()
+        utils.write_file(cite_path, writer.write(db))
+
+    # Prepare YAML front matter for Markdown file, keeping any existing page when overwriting.
+    # New pages are created with `hugo new` if given the Hugo command, to apply the site's archetype.
+    if hugo and not dry_run and not os.path.isfile(markdown_path):
         subprocess.call(f"{hugo} new {markdown_path} --kind publication", shell=True)
         if "docker-compose" in hugo:
             time.sleep(2)
-
     page = EditableFM(Path(bundle_path), dry_run=dry_run)
-    page.load(Path("index.md"))
+    page.load(Path("index.md"), template=PUBLICATION_ARCHETYPE)
 
     page.fm["title"] = entry["title"]
 
@@ -102,7 +266,7 @@ def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=F
     if "year" in entry and year == "":
         year = entry["year"]
     if len(year) == 0:
-        log.error(f'Invalid date for entry `{entry["ID"]}`.')
+        log.error("Invalid date for entry `%s`.", entry["ID"])
 
     page.fm["date"] = "-".join([year, month, day])
     if "publishDate" in page.fm:
@@ -133,20 +297,9 @@ def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=F
     # Allow reading the featured from the bibtex options key
     featured_from_bibtex = featured
     if "options" in entry:
-        try:
-            options = entry["options"].split(",")
-            for option in options:
-                assert isinstance(option, str)
-                if "=" in option:
-                    k, v = option.split("=",)
-                    if k.strip() == "featured":
-                        featured_from_bibtex = bool(v.strip())
-                        break
-                elif option.strip() == "featured":
-                    featured_from_bibtex = True
-                    break
-        except Exception as e:
-            log.warning("Could not parse options field: " + entry["options"], exc_info=e)
+        options = parse_bibtex_options(entry["options"])
+        if "featured" in options:
+            featured_from_bibtex = options["featured"].lower() in ("true", "1", "yes")
     page.fm["featured"] = featured_from_bibtex
 
     # Publication name.
@@ -173,7 +326,7 @@ def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=F
 
     # Save Markdown file.
     try:
-        log.info(f"Saving Markdown to '{markdown_path}'")
+        log.info("Saving Markdown to '%s'", markdown_path)
         if not dry_run:
             page.dump()
     except IOError:
@@ -182,17 +335,13 @@ def parse_bibtex_entry(entry, pub_dir="publication", featured=False, overwrite=F
 
 
 def slugify(s, lower=True):
-    bad_symbols = (".", "_", ":")  # Symbols to replace with hyphen delimiter.
-    delimiter = "-"
-    good_symbols = (delimiter,)  # Symbols to keep.
-    for r in bad_symbols:
-        s = s.replace(r, delimiter)
-
-    s = re.sub(r"(\D+)(\d+)", r"\1\-\2", s)  # Delimit non-number, number.
-    s = re.sub(r"(\d+)(\D+)", r"\1\-\2", s)  # Delimit number, non-number.
-    s = re.sub(r"((?<=[a-z])[A-Z]|(?<!\A)[A-Z](?=[a-z]))", r"\-\1", s)  # Delimit camelcase.
-    s = "".join(c for c in s if c.isalnum() or c in good_symbols).strip()  # Strip non-alphanumeric and non-hyphen.
-    s = re.sub("-{2,}", "-", s)  # Remove consecutive hyphens.
+    s = s.translate(SLUG_DELIMITER_TABLE)  # Replace bad symbols with hyphen delimiter.
+    s = RE_SLUG_BOUNDARY.sub("-", s)  # Delimit numbers and camelcase.
+    s = s.translate(SLUG_STRIP_TABLE)  # Strip ASCII non-alphanumeric and non-hyphen.
+    if not s.replace("-", "").isalnum():
+        s = "".join(c for c in s if c.isalnum() or c == "-")  # Strip remaining non-ASCII symbols.
+    s = s.strip()
+    s = RE_CONSECUTIVE_HYPHENS.sub("-", s)  # Remove consecutive hyphens.
 
     if lower:
         s = s.lower()
@@ -202,8 +351,13 @@ def slugify(s, lower=True):
 def clean_bibtex_authors(author_str):
     """Convert author names to `firstname(s) lastname` format."""
     authors = []
-    for author in author_str.replace("\n", " ").split(" and "):
-        name_parts = bibtexparser.customization.splitname(author)
+    for author in RE_AUTHOR_SEPARATOR.split(author_str.replace("\n", " ")):
+        words = author.split()
+        if len(words) == 2 and "," not in author and "{" not in author and "~" not in author:
+            # A plain `First Last` name needs no further splitting.
+            authors.append(" ".join(words))
+            continue
+        name_parts = splitname(author)
         fullname = " ".join(name_parts["first"] + name_parts["von"] + name_parts["last"])
         if name_parts["jr"]:
             fullname += ", " + " ".join(name_parts["jr"])
@@ -219,15 +373,29 @@ def clean_bibtex_tags(s, normalize=False):
     return tags
 
 
+def parse_bibtex_options(s):
+    """Parse a BibLaTeX options field, such as `key1=value1, key2`, into a dict"""
+    options = {}
+    for option in s.split(","):
+        key, delimiter, value = option.partition("=")
+        key = key.strip()
+        if key:
+            # Options given without a value, such as `key2`, are switched on.
+            options.setdefault(key, value.strip() if delimiter else "true")
+    return options
+
+
 def month2number(month):
     """Convert BibTeX or BibLateX month to numeric"""
-    from academic.cli import log
-
     if len(month) <= 2:  # Assume a 1 or 2 digit numeric month has been given.
         return month.zfill(2)
     else:  # Assume a textual month has been given.
         month_abbr = month.strip()[:3].title()
         try:
-            return str(list(calendar.month_abbr).index(month_abbr)).zfill(2)
-        except ValueError:
-            raise log.error("Please update the entry with a valid month.")
+            return MONTH_NUMBERS[month_abbr]
+        except KeyError:
+            from academic.cli import AcademicError
+
+            err = "Please update the entry with a valid month."
+            log.error(err)
+            raise AcademicError(err)
@@ -1,3 +1,5 @@
+import mmap
+import os
 from pathlib import Path
 
 
@@ -11,3 +13,29 @@ def hugo_in_docker_or_local():
         hugo = ""
 
     return " ".join([hugo, "hugo"])
+
+
+def read_file(path):
+    """Read a UTF-8 text file through a memory map, decoding it in one pass"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""  # Empty files cannot be memory mapped.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = str(data, "utf-8")
+
+    # Translate line endings like universal newlines mode of `open()` does.
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def write_file(path, text):
+    """Write text to a file as UTF-8, bypassing Python's buffered text layer"""
+    data = memoryview(text.encode("utf-8"))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
@@ -14,6 +14,7 @@ def get_version(package):
 
 version = get_version("academic")
 requirements = ["ruamel.yaml==0.16.10", "toml", "requests", "bibtexparser==1.1.0"]
+extras_requirements = {"fast": ["citerra"]}
 
 if sys.argv[-1] == "publish":
     if os.system("pip3 freeze --all | grep wheel"):
@@ -32,6 +33,18 @@ if sys.argv[-1] == "publish":
     shutil.rmtree("academic.egg-info")
     sys.exit()
 
+# Optionally compile the BibTeX import modules with Cython, falling back to pure Python if unset.
+ext_modules = []
+if os.environ.get("ACADEMIC_CYTHON"):
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        print("ACADEMIC_CYTHON is set but Cython is not installed.")
+        print("Use `pip install cython` and then `ACADEMIC_CYTHON=1 pip install --no-build-isolation -e .`.\nExiting.")
+        sys.exit(1)
+
+    ext_modules = cythonize(["academic/import_bibtex.py", "academic/_bibtex_backend.py"], language_level=3)
+
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
@@ -52,7 +65,9 @@ setup(
     license="MIT",
     packages=find_packages(exclude=["tests"]),
     python_requires=">=3.6",
+    ext_modules=ext_modules,
     install_requires=requirements,
+    extras_require=extras_requirements,
     entry_points="""
         [console_scripts]
         academic=academic.cli:main
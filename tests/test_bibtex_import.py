@@ -1,38 +1,249 @@
+import copy
+import functools
+import hashlib
+import importlib.metadata
+import sys
 import typing
 from io import StringIO
 from pathlib import Path
 
 import bibtexparser
-from bibtexparser.bparser import BibTexParser
+import pyparsing
+import pytest
 
-from academic import cli, import_bibtex
+from academic import _bibtex_backend, cli, import_bibtex, utils
 from academic.editFM import EditableFM
 
 bibtex_dir = Path(__file__).parent / "data"
 
+# Front matter expected for `book.bib`, without the `publishDate` which is not constant.
+_EXPECTED_BOOK_YAML = (
+    "---",
+    "title: The title of the book",
+    "date: '2019-01-01'",
+    "authors:",
+    "- Nelson Bigetti",
+    "- Firstname von Book-Author, Jr.",
+    "- Someone Else",
+    "publication_types:",
+    "- '5'",
+    'abstract: "Paragraph one.\\n\\nParagraph two.\\n\\nParagraph three."',
+    "featured: true",
+    "publication: ''",
+    "tags:",
+    "- Tag1",
+    "- Tag with spaces",
+    "- Mixedcase",
+    "---",
+)
+
 
 def test_bibtex_import():
     cli.parse_args(["import", "--dry-run", "--bibtex", "tests/data/article.bib"])
 
 
-def _process_bibtex(file, expected_count=1, normalize=False) -> "typing.List[EditableFM]":
+def test_bibtex_import_writes_bundles(tmp_path, monkeypatch):
+    """
+    This test imports enough entries to use the worker pool, including two entries with the same slug.
+    """
+    entries = ["@article{Smith0, title={T0}, year=2019}"]
+    entries += [f"@article{{Entry{i}, title={{T{i}}}, year=2019}}" for i in range(1, import_bibtex.PARALLEL_IMPORT_THRESHOLD + 2)]
+    entries += ["@article{smith_0, title={DUPLICATE}, year=2019}"]
+    Path(tmp_path, "publications.bib").write_text("\n".join(entries), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+
+    import_bibtex.import_bibtex("publications.bib")
+
+    bundles = sorted(path.name for path in Path("content/publication").iterdir())
+    assert bundles == sorted(["smith-0"] + [f"entry-{i}" for i in range(1, import_bibtex.PARALLEL_IMPORT_THRESHOLD + 2)])
+    for bundle in bundles:
+        assert Path("content/publication", bundle, "cite.bib").read_text(encoding="utf-8").startswith("@article{")
+        assert Path("content/publication", bundle, "index.md").is_file()
+
+    # The first of the entries sharing a slug is imported.
+    page = EditableFM(Path("content/publication/smith-0"))
+    page.load(Path("index.md"))
+    assert page.fm["title"] == "T0"
+    assert "@article{Smith0," in Path("content/publication/smith-0/cite.bib").read_text(encoding="utf-8")
+
+
+def test_bibtex_import_dry_run_is_serial(tmp_path, monkeypatch):
+    """
+    This test checks that dry runs, which write no files, import entries without starting worker processes.
+    """
+    entries = [f"@article{{Entry{i}, title={{T{i}}}, year=2019}}" for i in range(import_bibtex.PARALLEL_IMPORT_THRESHOLD + 1)]
+    Path(tmp_path, "publications.bib").write_text("\n".join(entries), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(import_bibtex, "ProcessPoolExecutor", None)
+
+    import_bibtex.import_bibtex("publications.bib", dry_run=True)
+
+    assert not Path("content").exists()
+
+
+def test_bibtex_import_pool_error(tmp_path, monkeypatch):
+    """
+    This test checks that an invalid entry stops an import using the worker pool, like a serial import.
+    """
+    entries = ["@article{Invalid, title={T}, year=2019, month={Smarch}}"]
+    entries += [f"@article{{Entry{i}, title={{T{i}}}, year=2019}}" for i in range(import_bibtex.PARALLEL_IMPORT_THRESHOLD)]
+    Path(tmp_path, "publications.bib").write_text("\n".join(entries), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(cli.AcademicError):
+        import_bibtex.import_bibtex("publications.bib")
+
+
+@pytest.mark.parametrize("archetype", [None, "archetypes/publication.md", "archetypes/publication/index.md"])
+def test_bibtex_import_archetype(archetype, tmp_path, monkeypatch):
+    """
+    This test checks that new pages are only created with `hugo new` if the site has its own publication archetype.
+    """
+    commands = []
+
+    def hugo_new(command, shell):
+        # Create the page from the site archetype, like `hugo new` would.
+        commands.append(command)
+        markdown_path = Path(command.split()[2])
+        markdown_path.parent.mkdir(parents=True, exist_ok=True)
+        markdown_path.write_text('---\ntitle: ""\ncustom: true\n---\n', encoding="utf-8")
+
+    Path(tmp_path, "publications.bib").write_text("@article{Entry, title={T}, year=2019}", encoding="utf-8")
+    if archetype:
+        Path(tmp_path, archetype).parent.mkdir(parents=True)
+        Path(tmp_path, archetype).write_text("---\ncustom: true\n---\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(import_bibtex.subprocess, "call", hugo_new)
+
+    import_bibtex.import_bibtex("publications.bib")
+
+    page = EditableFM(Path("content/publication/entry"))
+    page.load(Path("index.md"))
+    assert page.fm["title"] == "T"
+    if archetype:
+        assert commands == [" hugo new content/publication/entry/index.md --kind publication"]
+        assert page.fm["custom"] is True
+    else:
+        assert commands == []
+        assert "custom" not in page.fm
+        # The page is created from the bundled template, comments included.
+        assert set(import_bibtex.PUBLICATION_ARCHETYPE) <= set(page.fm)
+        assert "# Display this page in the Featured widget?" in Path("content/publication/entry/index.md").read_text(encoding="utf-8")
+
+
+def test_slugify():
+    assert import_bibtex.slugify("articleID") == "article-id"
+    assert import_bibtex.slugify("MyPhDThesis") == "my-ph-d-thesis"
+    assert import_bibtex.slugify("Smith2019a") == "smith-2019-a"
+    assert import_bibtex.slugify("doe:2020_foo.bar") == "doe-2020-foo-bar"
+    assert import_bibtex.slugify("HTMLParser", lower=False) == "HTML-Parser"
+    assert import_bibtex.slugify("ÉtéÀParis2019") == "étéà-paris-2019"
+    assert import_bibtex.slugify("a--b__c x") == "a-b-cx"
+
+
+def test_month2number():
+    assert import_bibtex.month2number("7") == "07"
+    assert import_bibtex.month2number("jul") == "07"
+    assert import_bibtex.month2number("December") == "12"
+    with pytest.raises(cli.AcademicError):
+        import_bibtex.month2number("Smarch")
+
+
+def test_parse_bibtex_options():
+    assert import_bibtex.parse_bibtex_options("option1=value1, featured=true, option3") == {
+        "option1": "value1",
+        "featured": "true",
+        "option3": "true",
+    }
+    assert import_bibtex.parse_bibtex_options("url=https://example.org/?a=b,") == {"url": "https://example.org/?a=b"}
+
+
+@pytest.mark.parametrize(
+    "options,featured,expected",
+    [
+        ("featured=false", False, False),
+        ("featured=false", True, False),
+        ("featured=True", False, True),
+        ("featured", False, True),
+        ("other=value", True, True),
+    ],
+)
+def test_featured_option(options, featured, expected):
     """
-    Parse a BibTeX .bib file and return the parsed metadata
-    :param file: The .bib file to parse
+    This test checks that the `featured` option of an entry takes precedence over the `featured` argument.
+    """
+    entry = {"ID": "x", "ENTRYTYPE": "article", "title": "T", "year": "2019", "options": options}
+    assert import_bibtex.parse_bibtex_entry(entry, featured=featured, dry_run=True).fm["featured"] is expected
+
+
+def test_clean_bibtex_authors():
+    assert import_bibtex.clean_bibtex_authors("Donald~E. Knuth and Ada~Lovelace") == ["Donald E. Knuth", "Ada Lovelace"]
+    assert import_bibtex.clean_bibtex_authors("Alan Turing\tand\tGrace Hopper") == ["Alan Turing", "Grace Hopper"]
+    assert import_bibtex.clean_bibtex_authors("von Book-Author, Jr., Firstname") == ["Firstname von Book-Author, Jr."]
+
+
+@pytest.mark.parametrize("value", ["plain", "{{University of Somewhere}}", "{O'neil} {x^2}", "Caf\\'{e} {\\\"o}", "a,,b} {:=}"])
+def test_latex_to_unicode(value):
+    assert _bibtex_backend.latex_to_unicode(value) == bibtexparser.latexenc.latex_to_unicode(value)
+
+
+def test_citerra_backend(monkeypatch):
+    """
+    This test checks that the optional citerra backend gives the same entries as bibtexparser.
+    """
+    citerra = pytest.importorskip("citerra")
+    path = Path(bibtex_dir, "macros.bib")
+    monkeypatch.setattr(_bibtex_backend, "citerra", citerra)
+    entries = _bibtex_backend.load_entries(path)
+    monkeypatch.setattr(_bibtex_backend, "citerra", None)
+    assert entries == _bibtex_backend.load_entries(path)
+    assert entries[0]["title"] == "The title of the PAPER"
+    assert entries[0]["booktitle"] == "Proc. of Conf 2019"
+    assert entries[0]["month"] == "July"
+
+
+def _process_bibtex(entries, expected_count=1, normalize=False) -> "typing.List[EditableFM]":
+    """
+    Parse the entries of a BibTeX .bib file and return the parsed metadata
+    :param entries: The entries of the .bib file, as returned by the `load_bibtex` fixture
     :param expected_count: The expected number of entries inside the .bib
     :param normalize: Whether to normalize the case of tags
     :return: The parsed metadata as a list of EditableFM
     """
-    parser = BibTexParser(common_strings=True)
-    parser.customization = import_bibtex.convert_to_unicode
-    parser.ignore_nonstandard_types = False
-    with Path(bibtex_dir, file).open("r", encoding="utf-8") as bibtex_file:
-        bib_database = bibtexparser.load(bibtex_file, parser=parser)
-        results = []
-        for entry in bib_database.entries:
-            results.append(import_bibtex.parse_bibtex_entry(entry, dry_run=True, normalize=normalize))
-        assert len(results) == expected_count
-        return results
+    parse = import_bibtex.parse_bibtex_entry
+    results = [parse(entry, dry_run=True, normalize=normalize) for entry in entries]
+    assert len(results) == expected_count
+    return results
+
+
+@pytest.fixture(scope="session")
+def load_bibtex(pytestconfig):
+    """
+    Return a function that loads the entries of a BibTeX .bib file, parsing each file only once per test session.
+    The entries are also stored in the pytest cache, keyed on the contents of the .bib file and of the BibTeX
+    loading code, so that later test runs can skip parsing unchanged files.
+    """
+    cache = getattr(pytestconfig, "cache", None)  # Unset if the cacheprovider plugin is disabled.
+    loader = hashlib.sha1(bibtexparser.__version__.encode())
+    loader.update(pyparsing.__version__.encode())  # The BibTeX grammar is built with pyparsing.
+    loader.update(repr(sys.version_info).encode())  # Unicode normalization depends on the Python version.
+    if _bibtex_backend.citerra is not None:
+        loader.update(importlib.metadata.version("citerra").encode())
+    for module in (_bibtex_backend, utils):
+        loader.update(Path(module.__file__).read_bytes())
+
+    @functools.lru_cache(maxsize=None)
+    def load(file) -> "typing.Tuple[dict, ...]":
+        path = Path(bibtex_dir, file)
+        key = "academic/bibtex/" + hashlib.sha1(loader.digest() + path.read_bytes()).hexdigest()
+        entries = cache.get(key, None) if cache else None
+        if entries is None:
+            entries = _bibtex_backend.load_entries(path)
+            if cache:
+                cache.set(key, entries)
+        return tuple(entries)
+
+    return load
 
 
 def _test_publication_type(metadata: EditableFM, expected_type: import_bibtex.PublicationType):
@@ -42,55 +253,63 @@ def _test_publication_type(metadata: EditableFM, expected_type: import_bibtex.Pu
     assert metadata.fm["publication_types"] == [str(expected_type.value)]
 
 
-def test_bibtex_types():
+@pytest.mark.parametrize(
+    "file,expected_type,expected_count",
+    [
+        ("article.bib", import_bibtex.PublicationType.JournalArticle, 1),
+        ("report.bib", import_bibtex.PublicationType.Report, 3),
+        ("thesis.bib", import_bibtex.PublicationType.Thesis, 3),
+        ("book.bib", import_bibtex.PublicationType.Book, 1),
+    ],
+)
+def test_bibtex_types(file, expected_type, expected_count, load_bibtex):
     """
     This test uses the import_bibtex functions to parse a .bib file and checks that the
     resulting metadata has the correct publication type set.
     """
-    _test_publication_type(_process_bibtex("article.bib")[0], import_bibtex.PublicationType.JournalArticle)
-    for metadata in _process_bibtex("report.bib", expected_count=3):
-        _test_publication_type(metadata, import_bibtex.PublicationType.Report)
-    for metadata in _process_bibtex("thesis.bib", expected_count=3):
-        _test_publication_type(metadata, import_bibtex.PublicationType.Thesis)
-    _test_publication_type(_process_bibtex("book.bib")[0], import_bibtex.PublicationType.Book)
+    for metadata in _process_bibtex(load_bibtex(file), expected_count=expected_count):
+        _test_publication_type(metadata, expected_type)
 
 
-def test_resulting_yaml_output():
+@pytest.fixture(scope="session")
+def _book_fm(load_bibtex):
     """
-    This test checks that the YAML generated for a .bib file looks as expected and that newlines are not filtered out.
+    Parse `book.bib` once per test session.
+    """
+    return _process_bibtex(load_bibtex("book.bib"), normalize=True)[0]
+
+
+@pytest.fixture
+def book_fm(_book_fm):
+    """
+    Return a copy of the metadata parsed from `book.bib`, so that tests can modify it.
+    """
+    return copy.deepcopy(_book_fm)
+
+
+def test_resulting_front_matter(book_fm):
+    """
+    This test checks the front matter parsed from a .bib file, without generating any YAML.
     """
-    result = _process_bibtex("book.bib", normalize=True)[0]
+    result = book_fm
 
-    # Check that the paragraph breaks were not stripped from the YAML:
+    # Check that the paragraph breaks were not stripped:
     assert result.fm["abstract"] == "Paragraph one.\n\nParagraph two.\n\nParagraph three."
     assert result.fm["authors"] == ["Nelson Bigetti", "Firstname von Book-Author, Jr.", "Someone Else"]
     assert result.fm["featured"] is True
 
+
+def test_resulting_yaml_output(book_fm):
+    """
+    This test checks that the YAML generated for a .bib file looks as expected and that newlines are not filtered out.
+    """
+    result = book_fm
+
     # Don't check the full string for publishDate since that is not constant.
     del result.fm["publishDate"]
 
     with StringIO() as output:
         result.write_to_file(output)
-        output.seek(0)
-        lines = output.readlines()
-
-    lines = [line.strip() for line in lines]  # .strip() to remove newline at end
-    assert lines == [
-        "---",
-        "title: The title of the book",
-        "date: '2019-01-01'",
-        "authors:",
-        "- Nelson Bigetti",
-        "- Firstname von Book-Author, Jr.",
-        "- Someone Else",
-        "publication_types:",
-        "- '5'",
-        'abstract: "Paragraph one.\\n\\nParagraph two.\\n\\nParagraph three."',
-        "featured: true",
-        "publication: ''",
-        "tags:",
-        "- Tag1",
-        "- Tag with spaces",
-        "- Mixedcase",
-        "---",
-    ]
+        lines = output.getvalue().splitlines()
+
+    assert tuple(lines) == _EXPECTED_BOOK_YAML